@@ -13,25 +13,105 @@ configure simulation parameters, visualize, and save the resulting structures.
 
 
 import os
+import sys
 import random
 import logging
-import subprocess
+import time
+import asyncio
+import codecs
 import hashlib
+import string
+import stat
+import tempfile
+import getpass
+import mmap
+import base64
+import threading
 from pathlib import Path
+from collections import OrderedDict
 
 import torch
+import psutil
 import streamlit as st
 import streamlit.components.v1 as components
 
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+
+# Configure logging for this module only; the script body re-executes on
+# every rerun, so only attach the handler once
 logger = logging.getLogger(__name__)
+if not logger.handlers:
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+# 3Dmol.js is inlined from a vendored copy if present, else loaded from the CDN
+VIEWER_JS_LOCAL = Path(__file__).parent / "static" / "3Dmol-min.js"
+VIEWER_JS_CDN = "https://3Dmol.org/build/3Dmol-min.js"
+
+# 3Dmol viewer page; "$$" escapes the literal "$" of the $3Dmol global
+VIEWER_TEMPLATE = string.Template("""
+    $viewer_script
+    <div id="molecule-viewer" style="height: 600px; width: 100%; position: relative;"></div>
+    <script>
+        let element = document.getElementById('molecule-viewer');
+        let config = { backgroundColor: 'white' };
+        let viewer = $$3Dmol.createViewer(element, config);
+        let data = atob("$pdb_b64");
+        
+        viewer.addModel(data, "pdb");
+        viewer.setStyle({}, {cartoon: {color: 'spectrum'}});
+        viewer.zoomTo();
+        viewer.render();
+        viewer.zoom(1.2, 1000);
+    </script>
+    """)
+
+# Leave one physical core free; SMT siblings oversubscribe boltz's threadpools
+MAX_WORKERS = max(1, (psutil.cpu_count(logical=False) or os.cpu_count()) - 1)
+
+# Input fastas go to a private directory on RAM-backed /dev/shm when available.
+# Named by uid: containers run with an arbitrary --user have no login name
+FASTA_OWNER = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+FASTA_DIR = (Path("/dev/shm" if Path("/dev/shm").exists() else tempfile.gettempdir())
+             / f"boltz_webui-{FASTA_OWNER}")
+
+# Number of fold results kept in memory across all sessions
+MAX_CACHED_FOLDS = 8
 
+# Minimum seconds between live log refreshes
+LOG_UPDATE_INTERVAL = 0.2
+# Bytes read from boltz's output per chunk
+LOG_CHUNK_SIZE = 4096
+
+# Characters permitted in each sequence type (whitespace is ignored)
+SEQ_WHITESPACE = b" \t\r\n"
+ALLOWED_CHARS = {
+    "protein": b"ACDEFGHIKLMNPQRSTVWY" + SEQ_WHITESPACE,
+    "rna": b"ACGU" + SEQ_WHITESPACE,
+    "dna": b"ACGT" + SEQ_WHITESPACE,
+}
+# 256-byte lookup tables mapping allowed bytes to 1 and all others to 0
+ALLOWED_LUTS = {
+    seq_type: bytes(1 if c in chars else 0 for c in range(256))
+    for seq_type, chars in ALLOWED_CHARS.items()
+}
+INVALID_SEQ_MESSAGES = {
+    "protein": "Protein sequence appears to contain non-canonical amino acid characters.",
+    "rna": "RNA sequence appears to contain noncanonical base characters.",
+    "dna": "DNA sequence appears to contain noncanonical base characters.",
+}
+
+@st.cache_resource
 def get_accelerator() -> str:
     """
     Determines the appropriate accelerator to use for computations.
 
+    Probing CUDA/MPS is slow, so the result is cached and reused across reruns.
+
     Returns:
         str: The name of the accelerator device ('cpu', 'mps', or 'cuda').
     """
@@ -46,6 +126,48 @@ def get_accelerator() -> str:
     else:
         return "cpu"
 
+@st.cache_resource(show_spinner=False)
+def get_viewer_script() -> str:
+    """
+    Builds the <script> tag that loads 3Dmol.js into the viewer page.
+
+    A vendored copy is inlined rather than served as a static file, since
+    Streamlit serves static .js as text/plain and browsers refuse to run it.
+
+    Returns:
+        str: An inline script with the vendored library, or a CDN script tag.
+    """
+
+    if VIEWER_JS_LOCAL.exists():
+        # Keep the library source from closing the surrounding script tag
+        viewer_js = VIEWER_JS_LOCAL.read_text().replace("</script", "<\\/script")
+        return f"<script>{viewer_js}</script>"
+    return f'<script src="{VIEWER_JS_CDN}"></script>'
+
+def _validate_core(seq: str, seq_type: str) -> str | None:
+    """
+    Checks a sequence against the alphabet of its type.
+
+    Kept free of Streamlit calls so it is safe to use from cached code.
+
+    Args:
+        seq (str): The input biological sequence to be validated.
+        seq_type (str): The type of sequence ('protein', 'dna', or 'rna').
+
+    Returns:
+        str | None: An error message if the sequence is invalid, else None.
+    """
+
+    # Any byte mapped to 0 by the lookup table is an offending character
+    seq_bytes = seq.encode('ascii', 'replace').upper()
+    if 0 in seq_bytes.translate(ALLOWED_LUTS[seq_type]):
+        return INVALID_SEQ_MESSAGES[seq_type]
+    # Whitespace is allowed above, but a sequence of nothing else is empty
+    if not seq_bytes.translate(None, SEQ_WHITESPACE):
+        return "Please enter a sequence."
+    
+    return None
+
 def validate_seq(seq, seq_type) -> bool:
     """
     Validates a biological sequence based on its type.
@@ -58,41 +180,252 @@ def validate_seq(seq, seq_type) -> bool:
         bool: True if the sequence is valid, False otherwise.
     """
 
-    seq = seq.strip().replace(' ', '').upper()
-    if seq_type == "rna" and set(seq) != {"A", "U", "C", "G"}:
-        st.error("RNA sequence appears to contain noncanonical base characters.")
-        return False
-    if seq_type == "dna" and set(seq) != {"A", "T", "C", "G"}:
-        st.error("DNA sequence appears to contain noncanonical base characters.")
-        return False
-    if seq_type == "protein" and {"B", "J", "O", "U", "X", "Z"}.intersection(set(seq)):
-        st.error("Protein sequence appears to contain non-canonical amino acid characters.")
+    msg = _validate_core(seq, seq_type)
+    if msg:
+        st.error(msg)
         return False
     
     return True
 
+def seq_hash(seq: str) -> str:
+    """
+    Computes the name used for a fasta file and its boltz run.
+
+    The hash is only used as a filename, so a fast non-cryptographic-use
+    digest is preferred: BLAKE3 if installed, otherwise BLAKE2b.
+
+    Args:
+        seq (str): The text to hash.
+
+    Returns:
+        str: A 32-character hex digest of the text.
+    """
+
+    if blake3 is not None:
+        return blake3(seq.encode('utf-8')).hexdigest(16)
+    return hashlib.blake2b(seq.encode('utf-8'), digest_size=16).hexdigest()
+
+def ensure_fasta_dir():
+    """
+    Creates FASTA_DIR readable and writable by the current user only.
+
+    Fastas are reused by name, so the directory must not be shared: another
+    user could otherwise plant a file and have it folded.
+
+    Raises:
+        PermissionError: If FASTA_DIR is not a real directory (e.g. a
+            symlink) or is owned by another user.
+    """
+
+    FASTA_DIR.mkdir(mode=0o700, exist_ok=True)
+    # lstat so a symlink cannot be swapped between this check and later use;
+    # a real directory in a sticky /dev/shm or /tmp cannot be replaced by others
+    fasta_dir_stat = FASTA_DIR.lstat()
+    if not stat.S_ISDIR(fasta_dir_stat.st_mode):
+        raise PermissionError(f"{FASTA_DIR} is not a directory.")
+    if hasattr(os, "getuid") and fasta_dir_stat.st_uid != os.getuid():
+        raise PermissionError(f"{FASTA_DIR} is owned by another user.")
+    FASTA_DIR.chmod(0o700)
+
 def make_fasta(seq: str, seq_type: str) -> str:
     """
     Creates a FASTA file for the given biological sequence.
 
+    The file is written to FASTA_DIR and named by the hash of its contents,
+    so an existing file for the same input is reused rather than rewritten.
+
     Args:
         seq (str): The input biological sequence.
         seq_type (str): The type of sequence ('protein', 'dna', or 'rna').
 
     Returns:
-        str: Path to the created FASTA file or None if validation fails.
+        str: Name of the created FASTA file (without extension) or None if
+        validation fails.
     """
 
     if validate_seq(seq, seq_type):
 
-        fname = hashlib.md5(seq.encode('utf-8')).hexdigest()
-        with open(f"temp/{fname}.fasta", 'w') as f:
-            f.write(f">A|{seq_type}\n{seq}")
+        fasta = f">A|{seq_type}\n{seq}"
+        fname = seq_hash(fasta)
+        # O_EXCL folds the existence check into the open; a single raw
+        # write avoids buffered text IO setup for such a small file
+        path = FASTA_DIR / f"{fname}.fasta"
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return fname
+        payload = fasta.encode('utf-8')
+        written = 0
+        try:
+            written = os.write(fd, payload)
+            if written != len(payload):
+                raise OSError(f"Short write to {path}: {written} of {len(payload)} bytes")
+        finally:
+            os.close(fd)
+            # Never leave a truncated fasta behind for the reuse path
+            if written != len(payload):
+                path.unlink(missing_ok=True)
         
         return fname
     
     return
 
+def run_async(coro):
+    """
+    Runs a coroutine to completion on a fresh event loop.
+
+    Streamlit sets the selector event loop policy on Windows, which cannot
+    run subprocesses, so a Proactor loop is created explicitly there.
+
+    Args:
+        coro: The coroutine to run.
+
+    Returns:
+        The result of the coroutine.
+    """
+
+    if sys.platform == "win32":
+        loop = asyncio.ProactorEventLoop()
+    else:
+        loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+async def _run_boltz(args: list[str], log_placeholder) -> int:
+    """
+    Runs a boltz command asynchronously, streaming its output to the UI.
+
+    Args:
+        args (list[str]): The command and its arguments.
+        log_placeholder: Streamlit placeholder that receives the live log.
+
+    Returns:
+        int: The return code of the process.
+    """
+
+    proc = await asyncio.create_subprocess_exec(*args,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.STDOUT)
+    buf = ""
+    last_update = 0.0
+    # Progress bars end lines with \r, so read fixed-size chunks rather than
+    # lines; the incremental decoder handles characters split across chunks
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        while chunk := await proc.stdout.read(LOG_CHUNK_SIZE):
+            buf += decoder.decode(chunk)
+            # Throttle UI updates to ~5 Hz to avoid rerender storms
+            now = time.monotonic()
+            if now - last_update >= LOG_UPDATE_INTERVAL:
+                log_placeholder.code(buf)
+                last_update = now
+        buf += decoder.decode(b"", final=True)
+        log_placeholder.code(buf)
+        await proc.wait()
+    finally:
+        # A Stop/rerun raises out of the UI calls above; don't orphan boltz
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+    return proc.returncode
+
+class FoldCache:
+    """
+    Bounded LRU store of fold results, shared across sessions and reruns.
+
+    Holds the raw model bytes keyed on the run name and generation
+    parameters. The oldest entries are evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> bytes | None:
+        with self._lock:
+            if key not in self._results:
+                return None
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def put(self, key: tuple, model_data: bytes):
+        with self._lock:
+            self._results[key] = model_data
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+@st.cache_resource
+def get_fold_cache() -> FoldCache:
+    """
+    Returns the process-wide fold result cache.
+
+    Returns:
+        FoldCache: The shared cache, created on first use.
+    """
+
+    return FoldCache(MAX_CACHED_FOLDS)
+
+def fold(fname: str,
+         accelerator: str,
+         sampling_steps: int,
+         diffusion_samples: int,
+         seed: int,
+         output_format: str,
+         num_workers: int,
+         log_placeholder) -> bytes:
+    """
+    Runs Boltz-1 on an existing FASTA and reads back the first model.
+
+    Args:
+        fname (str): Name of the FASTA file in FASTA_DIR (without extension).
+        accelerator (str): The accelerator passed to boltz.
+        sampling_steps (int): Number of diffusion sampling steps.
+        diffusion_samples (int): Number of diffusion samples.
+        seed (int): Random seed passed to boltz.
+        output_format (str): Output structure format ('pdb' or 'mmcif').
+        num_workers (int): Number of dataloader workers.
+        log_placeholder: Streamlit placeholder that receives the live log.
+
+    Returns:
+        bytes: The raw model_0 file contents.
+    """
+
+    # No tensor work happens here; keep torch threads from competing with boltz
+    torch.set_num_threads(1)
+    returncode = run_async(_run_boltz(["boltz",
+                                       "predict",
+                                       str(FASTA_DIR / f"{fname}.fasta"),
+                                       "--out_dir",
+                                       "./temp",
+                                       "--accelerator",
+                                       accelerator,
+                                       "--sampling_steps",
+                                       str(sampling_steps),
+                                       "--diffusion_samples",
+                                       str(diffusion_samples),
+                                       "--output_format",
+                                       output_format,
+                                       "--num_workers",
+                                       str(num_workers),
+                                       "--seed",
+                                       str(seed),
+                                       "--use_msa_server",
+                                       ],
+                                      log_placeholder))
+    if returncode != 0:
+        raise RuntimeError(f"boltz predict exited with code {returncode}")
+
+    location = f"./temp/boltz_results_{fname}/predictions/{fname}/{fname}_model_0.{output_format}"
+    with open(location, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return bytes(mm)
+
 def main():
     """
     Main function that sets up and runs the Streamlit web interface.
@@ -105,113 +438,107 @@ def main():
     st.set_page_config(layout="wide")
     st.title("⚡️ Boltz-1 Biomolecular Simulation Interface ⚡️")
 
-    # Create temp dir
+    # Create temp dirs
     os.makedirs("./temp", exist_ok=True)
+    ensure_fasta_dir()
     
-    # Input section
-    seq = st.text_input(
-        "Enter amino acid/nucleotide sequence",
-        help="Example: MSADAMKSK..., GCTGACGTAC..."
-    ).upper()
-
-    radios = st.columns(2, vertical_alignment='bottom')
-    sliders = st.columns(4, vertical_alignment='bottom')
-
-    # String parameters
-    seq_type = radios[0].radio("Sequence type", ["protein", "rna", "dna"])
-    output_format = radios[1].radio("Output format", ["pdb", "mmcif"])
-
-    # Numerical parameters
-    sampling_steps = sliders[0].slider("Sampling steps", 50, 300, 200)
-    diffusion_samples = sliders[1].slider("Diffusion samples", 1, 3, 1)
-    num_workers = sliders[2].slider("Workers", 1, os.cpu_count(), os.cpu_count())
-    rand_seed = random.randint(0, 9999)
-    seed = sliders[3].slider("Seed", 0, 9999, rand_seed)
+    # Input section, batched in a form so widget changes only rerun on submit
+    with st.form("fold"):
+        seq = st.text_input(
+            "Enter amino acid/nucleotide sequence",
+            help="Example: MSADAMKSK..., GCTGACGTAC..."
+        ).upper()
+
+        radios = st.columns(2, vertical_alignment='bottom')
+        sliders = st.columns(4, vertical_alignment='bottom')
+
+        # String parameters
+        seq_type = radios[0].radio("Sequence type", ["protein", "rna", "dna"])
+        output_format = radios[1].radio("Output format", ["pdb", "mmcif"])
+
+        # Numerical parameters
+        sampling_steps = sliders[0].slider("Sampling steps", 50, 300, 200)
+        diffusion_samples = sliders[1].slider("Diffusion samples", 1, 3, 1)
+        # A slider needs min < max, so hosts with 1-2 physical cores get no choice
+        if MAX_WORKERS > 1:
+            num_workers = sliders[2].slider("Workers", 1, MAX_WORKERS, MAX_WORKERS)
+        else:
+            num_workers = 1
+        # Draw the random default once per session so it survives reruns
+        rand_seed = st.session_state.setdefault('rand_seed', random.randint(0, 9999))
+        seed = sliders[3].slider("Seed", 0, 9999, rand_seed)
+
+        submitted = st.form_submit_button("Generate")
 
     # Generation call
-    if st.button("Generate"):
-        if not seq:
-            st.error("Please enter a sequence.")
-            return
-        fname = make_fasta(seq, seq_type)
-        if fname:
-            st.write(f"Created temporary fasta: {fname}")
-            try:
-                with st.spinner(f"Folding {len(seq)}-mer {seq_type} sequence..."):
-                    subprocess.run(["boltz",
-                                    "predict",
-                                    f"./temp/{fname}.fasta",
-                                    "--out_dir",
-                                    "./temp",
-                                    "--accelerator",
-                                    get_accelerator(),
-                                    "--sampling_steps",
-                                    str(sampling_steps),
-                                    "--diffusion_samples",
-                                    str(diffusion_samples),
-                                    "--output_format",
-                                    output_format,
-                                    "--num_workers",
-                                    str(num_workers),
-                                    "--seed",
-                                    str(seed),
-                                    "--use_msa_server",
-                                    ],
-                                    capture_output=True).stdout.strip()
+    if submitted and not seq:
+        # No return here, so the previous result below still renders
+        st.error("Please enter a sequence.")
+    elif submitted:
+        try:
+            # Probed on the script thread: cache_resource does not store
+            # results from threads without a ScriptRunContext on older Streamlit
+            accelerator = get_accelerator()
+            fname = make_fasta(seq, seq_type)
+            if fname:
+                # The worker count does not change the result, so it is not
+                # part of the cache key
+                key = (fname, sampling_steps, diffusion_samples, seed, output_format)
+                fold_cache = get_fold_cache()
+                model_data = fold_cache.get(key)
+                if model_data is None:
+                    st.write(f"Created temporary fasta: {fname}")
+                    with st.spinner(f"Folding {len(seq)}-mer {seq_type} sequence..."):
+                        model_data = fold(fname, accelerator, sampling_steps,
+                                          diffusion_samples, seed, output_format,
+                                          num_workers, st.empty())
+                    fold_cache.put(key, model_data)
+                st.write("Structure generated.")
+                st.session_state['last_result'] = {'fname': fname,
+                                                   'data': model_data,
+                                                   'fmt': output_format}
+                # Viewer page is rebuilt for the new model on this rerun
+                st.session_state.pop('viewer_html', None)
             
-                    st.write("Structure generated.")
-
-                    # Display model_0
-                    if output_format == "pdb":
-                        location = f"./temp/boltz_results_{fname}/predictions/{fname}/{fname}_model_0.pdb"
-                        pdb_data = Path(location).read_text()
-
-                        # Create a container for the viewer
-                        viewer_container = st.container(border=True)
-                        with viewer_container:
-                            st.markdown("**Generated PDB Model**")
-                            # Embed the 3Dmol React.js component
-                            components.html(
-                                f"""
-                                <script src="https://3Dmol.org/build/3Dmol-min.js"></script>
-                                <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-                                <div id="molecule-viewer" style="height: 600px; width: 100%; position: relative;"></div>
-                                <script>
-                                    $(document).ready(function() {{
-                                        let element = $('#molecule-viewer');
-                                        let config = {{ backgroundColor: 'white' }};
-                                        let viewer = $3Dmol.createViewer(element, config);
-                                        let data = `{pdb_data}`;
-                                        
-                                        viewer.addModel(data, "pdb");
-                                        viewer.setStyle({{}}, {{cartoon: {{color: 'spectrum'}}}});
-                                        viewer.zoomTo();
-                                        viewer.render();
-                                        viewer.zoom(1.2, 1000);
-                                    }});
-                                </script>
-                                """,
-                                height=600,
-                            )
-
-                        # Create download button
-                        st.download_button("Download PDB",
-                                           pdb_data,
-                                           "model_0.pdb")
-                    
-                    elif output_format == "mmcif":
-                        st.markdown("**MMCIF Preview Unavailable.**")
-                        location = f"./temp/boltz_results_{fname}/predictions/{fname}/{fname}_model_0.mmcif"
-                        cif_data = Path(location).read_text()
-
-                        # Create download button
-                        st.download_button("Download MMCIF",
-                                           cif_data,
-                                           "model_0.cif")
-                
-            except Exception as e:
-                st.error(f"An unexpected error occurred: {str(e)}")
-                logger.exception("Unexpected error in main workflow")
+        except Exception as e:
+            st.error(f"An unexpected error occurred: {str(e)}")
+            logger.exception("Unexpected error in main workflow")
+
+    # Display model_0 of the last fold, which persists across reruns
+    if 'last_result' in st.session_state:
+        last_result = st.session_state['last_result']
+        model_data = last_result['data']
+
+        if last_result['fmt'] == "pdb":
+            # Build the viewer page once per fold; identical HTML on later
+            # reruns lets the frontend keep the existing iframe
+            if 'viewer_html' not in st.session_state:
+                # Base64 keeps the PDB opaque to the JS parser
+                pdb_b64 = base64.b64encode(model_data).decode('ascii')
+                st.session_state['viewer_html'] = VIEWER_TEMPLATE.substitute(
+                    viewer_script=get_viewer_script(),
+                    pdb_b64=pdb_b64,
+                )
+
+            # Create a container for the viewer
+            viewer_container = st.container(border=True)
+            with viewer_container:
+                st.markdown("**Generated PDB Model**")
+                # Embed the 3Dmol React.js component
+                components.html(st.session_state['viewer_html'], height=600)
+
+            # Create download button
+            st.download_button("Download PDB",
+                               model_data,
+                               "model_0.pdb")
+        
+        elif last_result['fmt'] == "mmcif":
+            st.markdown("**MMCIF Preview Unavailable.**")
+
+            # Create download button
+            st.download_button("Download MMCIF",
+                               model_data,
+                               "model_0.cif")
         
 if __name__ == "__main__":
     main()